@@ -1,109 +1,165 @@
+import csv
+import numpy as np
 import pandas as pd
 import os
 
-# Load the bike movement log
-log_file = "bike_movement_log.csv"
-data = pd.read_csv(log_file)
+# The logger always writes these columns as floats, so skip pandas' type inference
+log_dtypes = {
+    'X': 'float64',
+    'Y': 'float64',
+    'Speed (km/h)': 'float64',
+    'Distance to Car 1 (m)': 'float64',
+    'Distance to Car 2 (m)': 'float64',
+}
 
 # Spawn coordinates of the cars
 car1_spawn_x, car1_spawn_y = 99.5, -11.0
 decision_y_threshold = -12.0  # Y-coordinate threshold for decision-making
 
-# Output file for the results
-output_file = "bike_analysis_results.csv"
+# Load the bike movement log
+def load_bike_log(log_file):
+    """
+    Load the columns of the bike movement log used by the analysis.
+    """
+    # Prefer the Parquet copy of the log (no text parsing) if the logger wrote one for this run
+    log_parquet_file = os.path.splitext(log_file)[0] + ".parquet"
+    if os.path.exists(log_parquet_file) and os.path.getmtime(log_parquet_file) >= os.path.getmtime(log_file):
+        return pd.read_parquet(log_parquet_file, columns=list(log_dtypes))
+    return pd.read_csv(log_file, usecols=list(log_dtypes), dtype=log_dtypes, engine='c')
 
 # Determine the bike's movement classification
 def classify_bike_movement(data, car1_x, decision_y_threshold):
     """
     Classify the bike's movement as 'left', 'right', or 'behind' based on its coordinates.
     """
+    y = data['Y'].to_numpy()
+
     # Check if the bike is always behind
-    if all(data['Y'] < decision_y_threshold):
+    if y.size == 0 or y.max() < decision_y_threshold:
         return "behind"
 
-    # Filter the data to only include points after the bike passes the decision threshold
-    post_decision_data = data[data['Y'] >= decision_y_threshold]
+    # Find the indices of the points after the bike passes the decision threshold
+    post_decision_idx = np.where(y >= decision_y_threshold)[0]
 
     # If there are no points after the threshold, default to "behind"
-    if post_decision_data.empty:
+    if post_decision_idx.size == 0:
         return "behind"
 
     # Check the bike's X coordinate after passing the threshold
-    final_x = post_decision_data.iloc[-1]['X']  # Use the last X coordinate after the threshold
+    final_x = data['X'].to_numpy()[post_decision_idx[-1]]  # Use the last X coordinate after the threshold
     if final_x > car1_x:
         return "left"
     else:
         return "right"
 
-# Classify the bike's movement
-bike_movement = classify_bike_movement(data, car1_spawn_x, decision_y_threshold)
-
-# Calculate average speed
-average_speed = data['Speed (km/h)'].mean()
-
-# Calculate average distance to the cars
-average_distance_car1 = data['Distance to Car 1 (m)'].mean()
-average_distance_car2 = data['Distance to Car 2 (m)'].mean()
-
-# Calculate smallest distance to the cars
-smallest_distance_car1 = data['Distance to Car 1 (m)'].min()
-smallest_distance_car2 = data['Distance to Car 2 (m)'].min()
-
 # Determine the next ID
-if os.path.exists(output_file):
-    # If the file exists, read it and find the max ID
-    existing_data = pd.read_csv(output_file)
-    if 'id' in existing_data.columns:
-        # Handle NaN values in the 'id' column
-        max_id = existing_data['id'].dropna().max()
-        next_id = int(max_id) + 1 if not pd.isna(max_id) else 1
-    else:
-        next_id = 1
-else:
+def get_next_id(output_file, tail_size=4096):
+    """
+    Find the next ID by reading only the last rows of the results file.
+    IDs are appended in increasing order, so the last row holds the max ID.
+    """
     # If the file doesn't exist, start with ID 1
-    next_id = 1
-
-# Prepare the results row
-result_row = {
-    "id": next_id,
-    "direction around cars": bike_movement,
-    "average speed": round(average_speed, 2),
-    "average distance to car 1": round(average_distance_car1, 2),
-    "average distance to car 2": round(average_distance_car2, 2),
-    "smallest distance to car 1": round(smallest_distance_car1, 2),
-    "smallest distance to car 2": round(smallest_distance_car2, 2),
-}
-
-# Write the results to a new CSV file
-if not os.path.exists(output_file):
-    # If the file doesn't exist, create it and write the header
-    with open(output_file, mode='w', newline='') as file:
-        header = [
-            "id",
-            "direction around cars",
-            "average speed",
-            "average distance to car 1",
-            "average distance to car 2",
-            "smallest distance to car 1",
-            "smallest distance to car 2",
-        ]
-        file.write(",".join(header) + "\n")
-
-# Append the results to the file
-with open(output_file, mode='a', newline='') as file:
-    file.write(
-        f"{result_row['id']},{result_row['direction around cars']},"
-        f"{result_row['average speed']},{result_row['average distance to car 1']},"
-        f"{result_row['average distance to car 2']},{result_row['smallest distance to car 1']},"
-        f"{result_row['smallest distance to car 2']}\n"
-    )
-
-# Output the results to the console
-print("Analysis Results:")
-print(f"Bike went around the cars on the {bike_movement} side.")
-print(f"Average Speed: {average_speed:.2f} km/h")
-print(f"Average Distance to Car 1: {average_distance_car1:.2f} m")
-print(f"Average Distance to Car 2: {average_distance_car2:.2f} m")
-print(f"Smallest Distance to Car 1: {smallest_distance_car1:.2f} m")
-print(f"Smallest Distance to Car 2: {smallest_distance_car2:.2f} m")
-print(f"Results have been saved to {output_file}.")
\ No newline at end of file
+    if not os.path.exists(output_file):
+        return 1
+
+    with open(output_file, 'rb') as file:
+        # The ID must be the first column of the header
+        if file.readline().split(b',', 1)[0].strip() != b'id':
+            return 1
+
+        # Read only the tail of the file
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(max(0, size - tail_size))
+        lines = file.read().splitlines()
+
+        # The first line of the tail may be cut off, unless the whole file was read
+        if size > tail_size:
+            lines = lines[1:]
+
+        # Take the last row with an ID, skipping the header and blank lines
+        for line in reversed(lines):
+            first_field = line.split(b',', 1)[0].strip()
+            if first_field.isdigit():
+                return int(first_field) + 1
+
+        # No ID in the tail, fall back to scanning the whole file
+        if size > tail_size:
+            file.seek(0)
+            for line in reversed(file.read().splitlines()):
+                first_field = line.split(b',', 1)[0].strip()
+                if first_field.isdigit():
+                    return int(first_field) + 1
+
+    return 1
+
+def main(log_file="bike_movement_log.csv", output_file="bike_analysis_results.csv"):
+    """
+    Analyze one bike movement log and append the results to `output_file`.
+    Returns the results row, so a driver can analyze many logs in one interpreter.
+    """
+    # Load the bike movement log
+    data = load_bike_log(log_file)
+
+    # Classify the bike's movement
+    bike_movement = classify_bike_movement(data, car1_spawn_x, decision_y_threshold)
+
+    # Calculate the average speed and the average/smallest distances to the cars in one pass
+    stats = data[['Speed (km/h)', 'Distance to Car 1 (m)', 'Distance to Car 2 (m)']].agg({
+        'Speed (km/h)': 'mean',
+        'Distance to Car 1 (m)': ['mean', 'min'],
+        'Distance to Car 2 (m)': ['mean', 'min'],
+    })
+
+    average_speed = stats.at['mean', 'Speed (km/h)']
+    average_distance_car1 = stats.at['mean', 'Distance to Car 1 (m)']
+    average_distance_car2 = stats.at['mean', 'Distance to Car 2 (m)']
+    smallest_distance_car1 = stats.at['min', 'Distance to Car 1 (m)']
+    smallest_distance_car2 = stats.at['min', 'Distance to Car 2 (m)']
+
+    next_id = get_next_id(output_file)
+
+    # Prepare the results row
+    result_row = {
+        "id": next_id,
+        "direction around car 1": bike_movement,  # One classification covers both cars
+        "direction around car 2": bike_movement,
+        "average speed": round(average_speed, 2),
+        "average distance to car 1": round(average_distance_car1, 2),
+        "average distance to car 2": round(average_distance_car2, 2),
+        "smallest distance to car 1": round(smallest_distance_car1, 2),
+        "smallest distance to car 2": round(smallest_distance_car2, 2),
+    }
+
+    # Append the results to the CSV file
+    header = [
+        "id",
+        "direction around car 1",
+        "direction around car 2",
+        "average speed",
+        "average distance to car 1",
+        "average distance to car 2",
+        "smallest distance to car 1",
+        "smallest distance to car 2",
+    ]
+    with open(output_file, mode='a', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        # If the file is new (or empty), write the header first
+        if file.tell() == 0:
+            writer.writerow(header)
+        writer.writerow([result_row[key] for key in header])
+
+    # Output the results to the console
+    print("Analysis Results:")
+    print(f"Bike went around the cars on the {bike_movement} side.")
+    print(f"Average Speed: {average_speed:.2f} km/h")
+    print(f"Average Distance to Car 1: {average_distance_car1:.2f} m")
+    print(f"Average Distance to Car 2: {average_distance_car2:.2f} m")
+    print(f"Smallest Distance to Car 1: {smallest_distance_car1:.2f} m")
+    print(f"Smallest Distance to Car 2: {smallest_distance_car2:.2f} m")
+    print(f"Results have been saved to {output_file}.")
+
+    return result_row
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,5 @@
+"""
+Shared code for the bike sensor sims (p17_logging_fix.py, p7_Sensors.py).
+Each script is a `Config` for `bikesim.control.run`.
+The submodules are imported directly, so a script only loads the dependencies it uses.
+"""
@@ -0,0 +1,134 @@
+import asyncio
+import functools
+import logging
+import struct
+import time
+from bleak import BleakScanner, BleakClient
+
+logger = logging.getLogger(__name__)
+
+############################
+# Global Variables
+############################
+
+notification_count = 0
+start_time = None  # time.monotonic_ns() when BLE notifications started
+no_rotation_count = 0  # Counts consecutive transmissions with no rotations
+
+# Shared data (BLE <-> CARLA)
+shared_data = {
+    "cumulative_wheel_revolutions": 0,
+    "last_wheel_event_time": 0,
+    "last_throttle": 0.0
+}
+csc_measurement = struct.Struct('<BIH')  # CSC measurement: flags, wheel revolutions (u32), last wheel event time (u16)
+
+############################
+# BLE / Wahoo
+############################
+
+def parse_csc_measurement(data):
+    """
+    Parse speed/cadence data from Wahoo sensor.
+    """
+    global shared_data
+
+    if len(data) < csc_measurement.size:
+        logger.warning("Ignoring short CSC measurement: %s", bytes(data).hex())
+        return
+
+    flags, cumulative_wheel_revolutions, last_wheel_event_time_raw = csc_measurement.unpack_from(data)
+
+    # Convert last wheel event time to seconds
+    last_wheel_event_time_seconds = last_wheel_event_time_raw / 1024
+
+    shared_data["cumulative_wheel_revolutions"] = cumulative_wheel_revolutions
+    shared_data["last_wheel_event_time"] = last_wheel_event_time_seconds
+
+    # Only formatted if DEBUG logging is on, so it doesn't slow down the BLE callback
+    logger.debug("Flags: %d, Cumulative Wheel Revolutions: %d, Last Wheel Event Time: %.3fs",
+                 flags, cumulative_wheel_revolutions, last_wheel_event_time_seconds)
+
+async def find_and_connect_wahoo(config):
+    """
+    Scan for the Wahoo sensor for up to `config.ble_scan_timeout` seconds,
+    then connect and receive its notifications for 30 seconds.
+    """
+    global start_time
+
+    device_name = "Wahoo SPEED C1E5"
+    found = asyncio.Event()
+    wahoo_device = None
+
+    def detection_callback(device, advertisement_data):
+        nonlocal wahoo_device
+
+        if wahoo_device is None and device_name in (device.name, advertisement_data.local_name):
+            wahoo_device = device
+            found.set()
+
+    # Stop scanning as soon as the sensor advertises, instead of waiting for whole scans
+    print("Scanning for Wahoo device...")
+    scanner = BleakScanner(detection_callback=detection_callback)
+    await scanner.start()
+    try:
+        await asyncio.wait_for(found.wait(), config.ble_scan_timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await scanner.stop()
+
+    if not wahoo_device:
+        print(f"{device_name} not found after {config.ble_scan_timeout} seconds.")
+        return
+
+    print(f"Found Wahoo device: {wahoo_device.name}, {wahoo_device.address}")
+
+    #Retry connection if it fails
+    for attempt in range(config.ble_connect_attempts):
+        try:
+            async with BleakClient(wahoo_device.address) as client:
+                print(f"Connected to {wahoo_device.address}")
+
+                services = await client.get_services()
+                for service in services:
+                    print(f"Service: {service.uuid}")
+                    for characteristic in service.characteristics:
+                        print(f"  Characteristic: {characteristic.uuid}")
+
+                characteristic_uuid = "00002a5b-0000-1000-8000-00805f9b34fb"
+                start_time = time.monotonic_ns()
+                await client.start_notify(characteristic_uuid, functools.partial(notification_handler, config))
+
+                await asyncio.sleep(30)
+                return  # Exit the function if connection is successful
+        except Exception as e:
+            print(f"Connection attempt {attempt + 1} failed: {e}")
+            await asyncio.sleep(5)  # Wait before retrying
+
+    print(f"Failed to connect to Wahoo device after {config.ble_connect_attempts} attempts.")
+
+def notification_handler(config, sender, data):
+    """
+    Handle notifications from the BLE Wahoo sensor.
+    """
+    global notification_count, no_rotation_count
+
+    notification_count += 1
+
+    # Parse the BLE data
+    previous_revolutions = shared_data["cumulative_wheel_revolutions"]
+    parse_csc_measurement(data)
+    current_revolutions = shared_data["cumulative_wheel_revolutions"]
+
+    # Check if there are no new rotations
+    if current_revolutions == previous_revolutions:
+        no_rotation_count += 1
+    else:
+        no_rotation_count = 0
+
+    # Print the data rate every 16 notifications rather than on every one
+    if config.print_ble_rate and notification_count & 15 == 0:
+        elapsed_ns = time.monotonic_ns() - start_time
+        if elapsed_ns > 0:
+            print(f"Data Rate: {notification_count * 1e9 / elapsed_ns:.2f} Hz")
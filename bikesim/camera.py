@@ -0,0 +1,80 @@
+import array
+import math
+import carla
+
+############################
+# Global Variables
+############################
+
+# Sine/cosine lookup tables at 0.1 degree resolution, indexed with `int(degrees * 10) % 3600`
+sin_lut = array.array('d', [math.sin(math.radians(i * 0.1)) for i in range(3600)])
+cos_lut = array.array('d', [math.cos(math.radians(i * 0.1)) for i in range(3600)])
+
+############################
+# First-Person Camera
+############################
+
+def update_first_person_camera(transform, spectator,
+                               _Location=carla.Location, _Rotation=carla.Rotation, _Transform=carla.Transform,
+                               _sin_lut=sin_lut, _cos_lut=cos_lut):
+    """
+    Dynamically position the camera at the cyclist's head for a first-person view.
+    The camera will follow the bike in a first-person perspective.
+    `transform` is the actor's transform, read once per tick by the control loop.
+    The underscore defaults bind globals to locals for speed; don't pass them.
+    """
+    if not transform or not spectator:
+        return
+
+    location = transform.location
+    rotation = transform.rotation
+
+    # Position the camera at the cyclist's head level
+    head_offset = 1.75  # Height to simulate head level
+    forward_offset = 0.4  # Slightly forward to simulate head position
+
+    # Calculate the camera's position relative to the cyclist
+    yaw_index = int(rotation.yaw * 10) % 3600
+    camera_x = location.x + forward_offset * _cos_lut[yaw_index]
+    camera_y = location.y + forward_offset * _sin_lut[yaw_index]
+    camera_z = location.z + head_offset
+
+    # Set the camera's location and rotation
+    camera_location = _Location(x=camera_x, y=camera_y, z=camera_z)
+    camera_rotation = _Rotation(pitch=rotation.pitch, yaw=rotation.yaw, roll=rotation.roll)
+    spectator.set_transform(_Transform(camera_location, camera_rotation))
+
+############################
+# Chase Camera
+############################
+
+def update_chase_camera(transform, spectator,
+                        _Location=carla.Location, _Rotation=carla.Rotation, _Transform=carla.Transform,
+                        _sin_lut=sin_lut, _cos_lut=cos_lut):
+    """
+    Position the camera behind and slightly above the actor with this `transform`.
+    The underscore defaults bind globals to locals for speed; don't pass them.
+    """
+    if not transform or not spectator:
+        return
+
+    location = transform.location
+    rotation = transform.rotation
+
+    distance_behind = 4
+    height = 2
+    yaw_index = int(rotation.yaw * 10) % 3600
+
+    camera_x = location.x - distance_behind * _cos_lut[yaw_index]
+    camera_y = location.y - distance_behind * _sin_lut[yaw_index]
+    camera_z = location.z + height
+
+    camera_location = _Location(x=camera_x, y=camera_y, z=camera_z)
+    camera_rotation = _Rotation(pitch=-10, yaw=rotation.yaw)
+    spectator.set_transform(_Transform(camera_location, camera_rotation))
+
+# Camera styles that can be chosen with `Config.camera`
+camera_styles = {
+    "first_person": update_first_person_camera,
+    "chase": update_chase_camera,
+}
@@ -0,0 +1,464 @@
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import carla
+import numpy as np
+
+from . import ble, socket_server
+from .camera import camera_styles, sin_lut
+from .timing import sleep_until_next_tick
+
+try:
+    import uvloop  # Faster event loop; not available on Windows
+except ImportError:
+    uvloop = None
+
+############################
+# Configuration
+############################
+
+@dataclass
+class Config:
+    """
+    Settings that differ between the sensor sim scripts.
+    """
+    recording_file: str  # CARLA recording of the run
+    camera: str = "first_person"  # Spectator camera style, a key of `camera_styles`
+    follow_camera: bool = True  # Move the camera with the bike every tick
+    log_file: Optional[str] = None  # Bike movement log, or None to not log
+    synchronous_mode: bool = True  # Step the CARLA server from the control loop
+    stop_key: Optional[str] = 'k'  # Key that ends the simulation, or None
+    steer_scale: float = 0.5  # Steering for a heading of 90 degrees
+    throttle_per_revolution: float = 0.015  # Extra throttle per cumulative wheel revolution
+    coast_when_idle: bool = True  # Slow down gradually when the wheel stops turning
+    print_heading: bool = False  # Print the heading and steering of each processed message
+    print_ble_rate: bool = False  # Print the BLE notification rate
+    ble_scan_timeout: float = 60  # Seconds to wait for the Wahoo sensor to advertise
+    ble_connect_attempts: int = 3  # Times to try connecting to the Wahoo sensor
+
+############################
+# Global Variables
+############################
+
+# Global references to the main actors so camera can switch
+bike_actor = None
+car_actor1 = None
+car_actor2 = None
+spectator_actor = None  #storing spectator actor
+log_path = None  # Log file the rows are written to at the end of the run
+log_columns = ["Time (s)", "Speed (km/h)", "X", "Y", "Z", "Distance to Car 1 (m)", "Distance to Car 2 (m)"]
+log_buffer = None  # Log rows, allocated by `open_log_file` only when the run is logged
+log_row_count = 0  # Number of rows used in `log_buffer`
+is_running = True  # Flag to control the simulation loop
+
+############################
+# Steering/Throttle Logic
+############################
+
+def process_heading_data(heading, json_time, config, _sin_lut=sin_lut):
+    """
+    Process heading data to calculate steering and throttle for the bike.
+    """
+    try:
+        steer = _sin_lut[int(heading * 10) % 3600] * config.steer_scale
+        steer = max(-1.0, min(1.0, steer))  # Clamp steering value
+
+        if config.print_heading:
+            print(f"Heading: {heading}°, Steering: {steer:.2f} ({steering_description(steer)}), Time: {json_time}")
+
+        # Use wheel revolutions as a simple throttle logic
+        shared_data = ble.shared_data
+        revolutions = shared_data["cumulative_wheel_revolutions"]
+
+        if config.coast_when_idle and ble.no_rotation_count >= 2:  # If no rotations for 3 transmissions
+            throttle = max(0.0, shared_data["last_throttle"] * 0.3)  # Gradual deceleration
+        elif config.coast_when_idle and revolutions < 5:  # Threshold for low revolutions
+            throttle = max(0.0, shared_data["last_throttle"] * 0.9)  # Gradual deceleration
+        else:
+            throttle = min(0.1 + revolutions * config.throttle_per_revolution, 1.0)  # Normal throttle calculation
+
+        shared_data["last_throttle"] = throttle  # Store the last throttle value
+        return steer, throttle
+    except Exception as e:
+        print(f"Error processing heading data: {e}")
+        return 0.0, 0.1
+
+def steering_description(steer):
+    """
+    Describe a steering value in words.
+    """
+    if steer > 0.7:
+        return "Full Right"
+    elif 0.3 < steer <= 0.7:
+        return "Slight Right"
+    elif -0.3 <= steer <= 0.3:
+        return "Straight"
+    elif -0.7 <= steer < -0.3:
+        return "Slight Left"
+    else:
+        return "Full Left"
+
+############################
+# Manual Camera Switch
+############################
+
+def handle_camera_command(user_cmd, update_camera):
+    """
+    Move the spectator camera to the actor named by a terminal command.
+    Returns False once the user asks to quit.
+    """
+    if user_cmd in ["quit", "exit"]:
+        print("Exiting camera input...")
+        return False
+    elif user_cmd == "bike":
+        if bike_actor and spectator_actor:
+            update_camera(bike_actor.get_transform(), spectator_actor)
+            print("Camera moved to Bike.")
+        else:
+            print("Bike or spectator not available.")
+    elif user_cmd == "car1":
+        if car_actor1 and spectator_actor:
+            update_camera(car_actor1.get_transform(), spectator_actor)
+            print("Camera moved to Car 1.")
+        else:
+            print("Car 1 or spectator not available.")
+    elif user_cmd == "car2":
+        if car_actor2 and spectator_actor:
+            update_camera(car_actor2.get_transform(), spectator_actor)
+            print("Camera moved to Car 2.")
+        else:
+            print("Car 2 or spectator not available.")
+    else:
+        print("Unknown command. Please type 'bike', 'car1', 'car2', or 'quit'.")
+    return True
+
+def stdin_reader_thread(loop, lines):
+    """
+    Runs in a separate thread, only where the event loop can't watch stdin (Windows).
+    Hands each line typed in the terminal to the event loop.
+    """
+    try:
+        for line in sys.stdin:
+            loop.call_soon_threadsafe(lines.put_nowait, line)
+        loop.call_soon_threadsafe(lines.put_nowait, '')  # End of input
+    except RuntimeError:
+        pass  # The event loop has closed
+
+async def camera_input(config):
+    """
+    Waits for user input in the terminal, on the event loop.
+    When the user types "bike", "car1", or "car2," move the spectator camera.
+    Type "exit" or "quit" to end.
+    """
+    loop = asyncio.get_running_loop()
+    lines = asyncio.Queue()
+    update_camera = camera_styles[config.camera]
+
+    try:
+        loop.add_reader(sys.stdin.fileno(), lambda: lines.put_nowait(sys.stdin.readline()))
+        watching_stdin = True
+    except (NotImplementedError, AttributeError, ValueError, OSError):
+        # The Windows event loops can't watch stdin, so read it in a daemon thread instead.
+        # (`run_in_executor(None, input)` would keep the program from exiting until Enter is pressed.)
+        threading.Thread(target=stdin_reader_thread, args=(loop, lines), daemon=True).start()
+        watching_stdin = False
+
+    try:
+        while True:
+            print("\nType 'bike', 'car1', 'car2', or 'quit' to switch camera view:")
+            line = await lines.get()
+            if not line or not handle_camera_command(line.strip().lower(), update_camera):
+                break
+    finally:
+        if watching_stdin:
+            loop.remove_reader(sys.stdin.fileno())
+
+############################
+# Logging Functionality
+############################
+
+def calculate_distances(location, car_locations, _array=np.array, _norm=np.linalg.norm):
+    """
+    Calculate the Euclidean distance from `location` to each of `car_locations` in one NumPy operation.
+    A missing location gets a large value (inf) instead of a distance.
+    """
+    if location is None:
+        return [float('inf')] * len(car_locations)
+
+    # Missing cars get NaN coordinates, so their distances come out as NaN and can be swapped for inf
+    nan = float('nan')
+    offsets = _array([(car_location.x, car_location.y, car_location.z) if car_location is not None else (nan, nan, nan)
+                      for car_location in car_locations], dtype=float)
+    offsets -= (location.x, location.y, location.z)
+    distances = _norm(offsets, axis=1)
+    distances[np.isnan(distances)] = float('inf')
+    return distances.tolist()
+
+def log_bike_data(transform, velocity, car1_location, car2_location, start_time):
+    """
+    Log the bike's movement data.
+    The row is stored in the preallocated `log_buffer`, which is written out by `close_log_file`.
+    The bike's transform and velocity and the cars' locations are read once per tick
+    by the control loop and passed in, rather than queried from the server again.
+    """
+    global log_buffer, log_row_count
+
+    if not transform or not velocity:
+        return
+
+    # Get the current time
+    current_time = time.time() - start_time
+
+    # Get the bike's speed
+    speed = math.sqrt(velocity.x ** 2 + velocity.y ** 2 + velocity.z ** 2) * 3.6  # Convert m/s to km/h
+
+    # Get the bike's position
+    x, y, z = transform.location.x, transform.location.y, transform.location.z
+
+    # Calculate proximity to other vehicles
+    distance_to_car1, distance_to_car2 = calculate_distances(transform.location, (car1_location, car2_location))
+
+    # Double the buffer if the run outlasts the preallocated rows
+    if log_row_count == len(log_buffer):
+        log_buffer = np.concatenate((log_buffer, np.empty_like(log_buffer)))
+
+    # Buffer the row until the log is written
+    log_buffer[log_row_count] = (current_time, speed, x, y, z, distance_to_car1, distance_to_car2)
+    log_row_count += 1
+
+def open_log_file(log_file):
+    """
+    Start a new log; its rows are kept in `log_buffer` until `close_log_file`.
+    """
+    global log_path, log_buffer, log_row_count
+
+    log_path = log_file
+    log_buffer = np.empty((int(3600 / 0.05), len(log_columns)))  # Preallocated for an hour of 20 Hz ticks
+    log_row_count = 0
+
+def close_log_file():
+    """
+    Write the buffered log rows to the CSV log file in one go.
+    """
+    global log_path, log_buffer
+
+    if log_path is None:
+        return
+
+    # A 1 MiB buffer means the rows go out in a few large writes
+    with open(log_path, mode='w', newline='', buffering=1 << 20) as log_fh:
+        np.savetxt(log_fh, log_buffer[:log_row_count], fmt='%.6f', delimiter=',', header=','.join(log_columns), comments='')
+    log_path = None
+    log_buffer = None
+
+############################
+# CARLA Control Loop
+############################
+
+def stop_simulation(event):
+    """
+    Keyboard hook for the stop key. Ends the control loop at its next iteration.
+    """
+    global is_running
+
+    if is_running:
+        print(f'Simulation killed with {event.name}')
+        is_running = False
+
+async def carla_control_loop(config):
+    global bike_actor, car_actor1, car_actor2, spectator_actor, is_running
+
+    data_counter = 0
+    process_every_nth = 5
+    last_control = None  # (steer, throttle) last sent to the bike
+    control_tolerance = 1e-3  # Smaller changes aren't worth another apply_control call
+    update_camera = camera_styles[config.camera]
+
+    if config.log_file:
+        open_log_file(config.log_file)
+
+    start_time = time.time()
+    client = None
+    original_settings = None
+    keyboard = None  # Only imported with a stop key, as its hooks need root on Linux
+
+    try:
+        client = carla.Client('127.0.0.1', 2000)
+        client.set_timeout(10.0)
+        world = client.get_world()
+
+        # Run the server in synchronous mode, so each tick gives one snapshot of every actor
+        if config.synchronous_mode:
+            original_settings = world.get_settings()
+            settings = world.get_settings()
+            settings.synchronous_mode = True
+            settings.fixed_delta_seconds = 0.05
+            world.apply_settings(settings)
+
+        loop = asyncio.get_running_loop()
+
+        blueprint_library = world.get_blueprint_library()
+        bike_bp = blueprint_library.find('vehicle.diamondback.century')
+        car1_bp = blueprint_library.find('vehicle.nissan.patrol')   # Car 1 = Nissan Patrol
+        car2_bp = blueprint_library.find('vehicle.tesla.model3')    # Car 2 = Tesla Model 3
+
+        # Start recording before spawning, so all actors are recorded
+        print(f"Starting simulation recording: {config.recording_file}")
+        client.start_recorder(config.recording_file)
+
+        # ----
+        # MANUAL SPAWN LOCATIONS
+        # ----
+        bike_transform = carla.Transform(
+            carla.Location(x=99.5, y=-25.0, z=0.5),
+            carla.Rotation(pitch=0.0, yaw=90.0, roll=0.0)
+        )
+
+        car1_transform = carla.Transform(
+            carla.Location(x=99.5, y=-11.0, z=0.5),
+            carla.Rotation(pitch=0.0, yaw=90.0, roll=0.0)
+        )
+
+        car2_transform = carla.Transform(
+            carla.Location(x=99.5, y=-5.0, z=0.5),
+            carla.Rotation(pitch=0.0, yaw=90.0, roll=0.0)
+        )
+        # ----
+
+        # Spawn bike and cars using the chosen transforms:
+        bike_actor = world.spawn_actor(bike_bp, bike_transform)
+        print(f"Bike manually spawned at {bike_transform.location}")
+
+        car_actor1 = world.spawn_actor(car1_bp, car1_transform)
+        print(f"Car 1 (Nissan Patrol) manually spawned at {car1_transform.location}")
+        car_actor1.apply_control(carla.VehicleControl(throttle=0.0, brake=1.0))
+
+        car_actor2 = world.spawn_actor(car2_bp, car2_transform)
+        print(f"Car 2 (Tesla Model 3) manually spawned at {car2_transform.location}")
+        car_actor2.apply_control(carla.VehicleControl(throttle=0.0, brake=1.0))
+
+        # Move spectator to bike by default
+        spectator_actor = world.get_spectator()
+        update_camera(bike_actor.get_transform(), spectator_actor)
+
+        # Stop the simulation when the stop key is pressed, without polling the keyboard every tick
+        is_running = True
+        if config.stop_key:
+            import keyboard
+            keyboard.on_press_key(config.stop_key, stop_simulation)
+
+        # Basic control loop, at a fixed 20 Hz
+        tick_interval = 0.05
+        next_tick_time = loop.time()
+        while is_running:
+            # Advance the simulation one step (off the event loop, so BLE and the socket keep running)
+            if config.synchronous_mode:
+                await loop.run_in_executor(None, world.tick)
+
+            # Read every actor's state from the snapshot of that frame instead of separate RPCs
+            if config.follow_camera or config.log_file:
+                snapshot = world.get_snapshot()
+                bike_snapshot = snapshot.find(bike_actor.id) if bike_actor else None
+                bike_transform = bike_snapshot.get_transform() if bike_snapshot else None
+                bike_velocity = bike_snapshot.get_velocity() if bike_snapshot else None
+                car1_snapshot = snapshot.find(car_actor1.id) if car_actor1 else None
+                car2_snapshot = snapshot.find(car_actor2.id) if car_actor2 else None
+                car1_location = car1_snapshot.get_transform().location if car1_snapshot else None
+                car2_location = car2_snapshot.get_transform().location if car2_snapshot else None
+
+            # Update the spectator camera to follow the bike dynamically
+            if config.follow_camera and bike_transform and spectator_actor:
+                update_camera(bike_transform, spectator_actor)
+
+            # Process heading data and control the bike
+            heading_data = socket_server.latest_heading_data
+            if heading_data:
+                heading, json_time = heading_data
+                data_counter += 1
+
+                if data_counter % process_every_nth == 0:
+                    steer, throttle = process_heading_data(heading, json_time, config)
+                    # The bike keeps its last control, so only send it again when it changes
+                    if bike_actor and (last_control is None
+                                       or abs(steer - last_control[0]) >= control_tolerance
+                                       or abs(throttle - last_control[1]) >= control_tolerance):
+                        control = carla.VehicleControl(throttle=throttle, steer=steer)
+                        bike_actor.apply_control(control)
+                        last_control = (steer, throttle)
+
+            # Log bike data
+            if config.log_file:
+                log_bike_data(bike_transform, bike_velocity, car1_location, car2_location, start_time)
+
+            # Sleep until the next tick is due, so time spent in the loop doesn't slow it down
+            next_tick_time = await sleep_until_next_tick(next_tick_time, tick_interval)
+
+    finally:
+        # Write the buffered log rows to the log file first, so a dead server can't lose them
+        close_log_file()
+
+        # Stop recording the simulation
+        if client:
+            print(f"Stopping simulation recording: {config.recording_file}")
+            client.stop_recorder()
+
+        # Remove the keyboard hook
+        if keyboard is not None:
+            keyboard.unhook_all()
+
+        # Put the server back in its original (asynchronous) mode
+        if original_settings:
+            world.apply_settings(original_settings)
+
+        # Check if the recording file was created
+        if os.path.exists(config.recording_file):
+            print(f"Recording saved successfully: {config.recording_file}")
+        else:
+            print(f"Error: Recording file {config.recording_file} was not created.")
+
+        # Cleanup
+        if bike_actor:
+            bike_actor.destroy()
+        if car_actor1:
+            car_actor1.destroy()
+        if car_actor2:
+            car_actor2.destroy()
+
+        print("Destroyed bike and cars.")
+
+############################
+# Main Entry Point
+############################
+
+async def main(config):
+    # Start the socket server on the event loop
+    socket_task = asyncio.create_task(socket_server.run_socket_server())
+    socket_task.add_done_callback(socket_server.report_server_error)
+
+    # Read camera commands from the terminal in the background
+    camera_task = asyncio.create_task(camera_input(config))
+
+    # Start BLE + CARLA loops concurrently
+    try:
+        await asyncio.gather(
+            ble.find_and_connect_wahoo(config),
+            carla_control_loop(config)
+        )
+    finally:
+        # The server runs forever, so stop it (and the camera input) once the simulation is over
+        socket_task.cancel()
+        camera_task.cancel()
+
+def run(config):
+    """
+    Run the simulation with `config` until it ends.
+    """
+    # Run on uvloop where it's installed, otherwise on the default event loop
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    asyncio.run(main(config))
@@ -0,0 +1,140 @@
+import asyncio
+import functools
+import json
+import re
+import traceback
+
+try:
+    import orjson  # Faster JSON parsing for newline-delimited messages
+except ImportError:
+    orjson = None
+
+############################
+# Global Variables
+############################
+
+# Latest heading data from socket
+latest_heading_data = None  # (heading, logging time) of the newest message, replaced as a whole
+json_whitespace = re.compile(r'[ \t\n\r]*')  # Whitespace allowed between JSON objects
+json_decoder = json.JSONDecoder()  # Shared decoder for messages that aren't newline-delimited
+
+############################
+# Socket Server
+############################
+
+def parse_json_messages(data):
+    """
+    Parse the complete JSON objects at the start of `data` (bytes or bytearray).
+    Returns the parsed objects and the number of bytes they used up.
+    Newline-delimited objects are parsed with orjson if it's installed;
+    anything else is parsed with the standard library decoder.
+    """
+    objects = []
+    consumed = 0
+
+    # Fast path: one JSON object per line
+    if orjson is not None:
+        while True:
+            end = data.find(b'\n', consumed)
+            if end == -1:
+                break
+            line = data[consumed:end]
+            if line.strip():
+                try:
+                    objects.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    break  # Not one object per line, parse the rest below
+            consumed = end + 1
+
+    # A partial message can't hold a complete object yet, so don't decode it on every read
+    if data.find(b'}', consumed) == -1:
+        return objects, consumed
+
+    # Standard library path for whatever is left
+    try:
+        text = data[consumed:].decode()  # bytes -> string
+    except UnicodeDecodeError:
+        # A character was split between packets, wait for the rest
+        return objects, consumed
+
+    index = 0
+    while True:
+        index = json_whitespace.match(text, index).end()
+        try:
+            json_object, index = json_decoder.raw_decode(text, index)
+            objects.append(json_object)
+        except json.JSONDecodeError:
+            # Incomplete data, wait for more
+            break
+        except Exception as e:
+            print("Error parsing JSON:", e)
+            break
+
+    consumed += index if text.isascii() else len(text[:index].encode())
+    return objects, consumed
+
+async def run_socket_server(read_size=65536):
+    """
+    Socket server that listens for incoming JSON data (heading, location, etc.)
+    and updates `latest_heading_data`. Runs on the asyncio event loop until cancelled.
+    `read_size` is the most bytes read from a client at a time.
+    """
+    host = '0.0.0.0'
+    port = 12345
+
+    server = await asyncio.start_server(functools.partial(handle_socket_client, read_size=read_size), host, port)
+    print(f"Listening on {host}:{port}")
+
+    async with server:
+        await server.serve_forever()
+
+def report_server_error(task):
+    """
+    Done-callback for the `run_socket_server` task.
+    Prints why the server stopped (e.g. the port is already in use) as soon as it happens,
+    since the simulation would otherwise carry on without heading data.
+    """
+    if task.cancelled():
+        return
+
+    e = task.exception()
+    if e is not None:
+        print("Socket server stopped, no heading data will be received:")
+        traceback.print_exception(type(e), e, e.__traceback__)
+
+async def handle_socket_client(reader, writer, read_size=65536):
+    """
+    Read JSON data from one connected client until it disconnects.
+    """
+    global latest_heading_data
+
+    addr = writer.get_extra_info('peername')
+    print(f"Connected by {addr}")
+    buffer = bytearray()  # Received bytes waiting to be parsed
+
+    try:
+        while True:
+            data = await reader.read(read_size)
+            if not data:
+                break
+            buffer += data
+
+            # Parse every complete JSON object in the buffer
+            json_objects, consumed = parse_json_messages(buffer)
+            if json_objects:
+                message = json_objects[-1]
+                try:
+                    # Publish a new immutable tuple, so the control loop can use it without copying
+                    latest_heading_data = (float(message.get("locationTrueHeading", 0.0)), message.get("loggingTime", "Unknown"))
+                except (AttributeError, TypeError, ValueError) as e:
+                    print(f"Error reading heading data: {e}")
+
+            # Drop the parsed data, keeping the unparsed rest
+            del buffer[:consumed]
+            if len(buffer) > 65536:
+                print("Socket buffer full of unparsable data, discarding it")
+                buffer.clear()
+    except Exception as e:
+        print("Socket receive error:", e)
+    finally:
+        writer.close()
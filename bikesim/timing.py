@@ -0,0 +1,21 @@
+import asyncio
+
+############################
+# Tick Pacing
+############################
+
+async def sleep_until_next_tick(next_tick_time, tick_interval):
+    """
+    Sleep until the tick after `next_tick_time` is due, so time spent in the loop doesn't slow it down.
+    Returns the time of that tick, to pass in on the next call.
+    Times are `loop.time()` values; start with `asyncio.get_running_loop().time()`.
+    """
+    loop = asyncio.get_running_loop()
+
+    next_tick_time += tick_interval
+    delay = next_tick_time - loop.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    else:
+        next_tick_time = loop.time()  # Running late, so drop the missed ticks instead of rushing them
+    return next_tick_time
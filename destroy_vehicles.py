@@ -20,9 +20,8 @@ def destroy_all_vehicles():
 
         print(f"Found {len(vehicles)} vehicles. Destroying them...")
 
-        # Destroy all vehicles
-        for vehicle in vehicles:
-            vehicle.destroy()
+        # Destroy all vehicles in one batched request
+        client.apply_batch_sync([carla.command.DestroyActor(vehicle.id) for vehicle in vehicles])
 
         print("All vehicles have been destroyed.")
 
@@ -1,8 +1,9 @@
 import carla
+import numpy as np
 import pandas as pd
 import os
-import time
 import random
+import re
 
 # Input CSV file
 input_csv = "bike_analysis_results.csv"
@@ -11,29 +12,40 @@ input_csv = "bike_analysis_results.csv"
 left_recording_log = "C:/CARLA_0.9.15/WindowsNoEditor/PythonAPI/examples/Prototypes/left_recording.log"
 right_recording_log = "C:/CARLA_0.9.15/WindowsNoEditor/PythonAPI/examples/Prototypes/right_recording.log"
 
+# Function to read how long a CARLA recording lasts
+def get_recording_duration(client, log_file, default_duration=10.0):
+    """
+    Returns the duration of a CARLA recording in seconds, parsed from the recorder's file info.
+    Falls back to `default_duration` if the info doesn't contain a duration.
+    """
+    info = client.show_recorder_file_info(log_file, False)
+    match = re.search(r"Duration:\s*([\d.]+)\s*seconds", info)
+    return float(match.group(1)) if match else default_duration
+
 # Function to replay a CARLA log file
-def replay_carla_log(log_file):
+def replay_carla_log(client, log_file):
     """
     Replays a CARLA log file using CARLA's replay functionality.
+    `client` is an already connected CARLA client.
     """
     try:
-        # Connect to the CARLA server
-        client = carla.Client('127.0.0.1', 2000)
-        client.set_timeout(10.0)
-
         # Check if the recording file exists
         if not os.path.exists(log_file):
             print(f"Recording file not found: {log_file}")
             return
 
-        print(f"Replaying recording: {log_file}")
-        client.replay_file(log_file, 0.0, 0.0, 0)  # Replay from the beginning, for the full duration
+        duration = get_recording_duration(client, log_file)
 
-        # Wait for the server to load the replay
-        time.sleep(2)
+        print(f"Replaying recording: {log_file} ({duration:.1f} s)")
+        client.replay_file(log_file, 0.0, 0.0, 0)  # Replay from the beginning, for the full duration
 
-        # Get the world and list all actors in the replay
+        # Wait for the server to tick with the replay loaded, then get the world again,
+        # since the replay may have loaded a different map (a new episode)
+        client.get_world().wait_for_tick(10.0)
         world = client.get_world()
+        replay_start = world.get_snapshot().timestamp.elapsed_seconds
+
+        # List all actors in the replay
         actors = world.get_actors()
         # print("Actors in the replay:")
         # for actor in actors:
@@ -50,8 +62,9 @@ def replay_carla_log(log_file):
 
         print(f"Camera moved to bike position: {bike_location}")
 
-        # Optional: Let the replay run for a specific duration
-        time.sleep(10)  # Adjust this to match the duration of your recording
+        # Let the replay run until the end of the recording
+        while world.wait_for_tick(10.0).timestamp.elapsed_seconds - replay_start < duration:
+            pass
 
         print("Replay finished.")
 
@@ -67,11 +80,13 @@ def analyze_bike_movement():
         print(f"Input CSV file not found: {input_csv}")
         return None
 
-    # Load the dataset
-    data = pd.read_csv(input_csv)
+    # Load the car2 direction column
+    data = pd.read_csv(input_csv, usecols=["direction around car 2"])
 
     # Calculate the distribution of "left" and "right" for car2
-    car2_distribution = data["direction around car 2"].value_counts(normalize=True)  # Get proportions
+    directions = data["direction around car 2"].dropna().to_numpy(dtype=str)
+    values, counts = np.unique(directions, return_counts=True)
+    car2_distribution = dict(zip(values, counts / counts.sum()))  # Get proportions
 
     # Print the distribution
     print("\nCar 2 Distribution (Proportions):")
@@ -103,11 +118,15 @@ def main():
     # Print the chosen direction
     print(f"\nChosen direction for replay: {direction.capitalize()}")
 
+    # Connect to the CARLA server once and reuse the client for the replay
+    client = carla.Client('127.0.0.1', 2000)
+    client.set_timeout(10.0)
+
     # Replay the appropriate recording based on the probabilistic choice
     if direction == "left":
-        replay_carla_log(left_recording_log)
+        replay_carla_log(client, left_recording_log)
     elif direction == "right":
-        replay_carla_log(right_recording_log)
+        replay_carla_log(client, right_recording_log)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
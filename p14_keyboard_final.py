@@ -2,10 +2,17 @@ import asyncio
 import threading
 import carla
 import math
+from math import cos as _cos, sin as _sin, radians as _radians
 import keyboard  # For capturing keypresses
 import time
-import csv
-import os  # For checking file existence
+import os  # For checking the recording file
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # The Parquet copy of the log is optional
+    pa = None
 
 ############################
 # Global Variables
@@ -16,14 +23,33 @@ car_actor1 = None
 car_actor2 = None
 spectator_actor = None  # We'll store the spectator here
 log_file = "bike_movement_log.csv"  # Log file name
+log_parquet_file = "bike_movement_log.parquet"  # Columnar copy of the log, written if pyarrow is installed
+log_columns = ["Time (s)", "Speed (km/h)", "X", "Y", "Z", "Distance to Car 1 (m)", "Distance to Car 2 (m)"]
+log_buffer = np.empty((int(3600 / 0.05), len(log_columns)))  # Preallocated for an hour of 20 Hz ticks
+log_row_count = 0  # Number of rows used in `log_buffer`
+log_every_nth_tick = 4  # Log at 5 Hz; the analysis only needs means, minimums and the final side
 recording_file = "C:/CARLA_0.9.15/WindowsNoEditor/PythonAPI/examples/Prototypes/simulation_recording.log"  # Recording file name
 client = None  # CARLA client
 is_running = True  # Flag to control the simulation loop
 
+keys_down = {'up': False, 'down': False, 'left': False, 'right': False, 'k': False}  # Updated by keyboard hooks
+last_camera_pose = None  # Bike pose the spectator camera was last placed for
+
 ############################
 # Arrow Key Control Logic
 ############################
 
+def register_key_hooks():
+    """
+    Register keyboard hooks that keep `keys_down` up to date,
+    so the control loop doesn't have to poll the keyboard every tick.
+    'k' stays set once pressed, so a quick tap between ticks isn't missed.
+    """
+    for key in ('up', 'down', 'left', 'right'):
+        keyboard.on_press_key(key, lambda event, key=key: keys_down.__setitem__(key, True))
+        keyboard.on_release_key(key, lambda event, key=key: keys_down.__setitem__(key, False))
+    keyboard.on_press_key('k', lambda event: keys_down.__setitem__('k', True))
+
 def get_keyboard_input():
     """
     Get keyboard input for controlling the bike.
@@ -32,18 +58,8 @@ def get_keyboard_input():
     Left Arrow: Steer Left
     Right Arrow: Steer Right
     """
-    throttle = 0.0
-    steer = 0.0
-
-    if keyboard.is_pressed('up'):
-        throttle = 1.0
-    elif keyboard.is_pressed('down'):
-        throttle = -1.0
-
-    if keyboard.is_pressed('left'):
-        steer = -1.0
-    elif keyboard.is_pressed('right'):
-        steer = 1.0
+    throttle = 1.0 if keys_down['up'] else -1.0 if keys_down['down'] else 0.0
+    steer = -1.0 if keys_down['left'] else 1.0 if keys_down['right'] else 0.0
 
     return throttle, steer
 
@@ -55,7 +71,10 @@ def update_spectator_camera(actor, spectator):
     """
     Dynamically position the camera behind and slightly above the bike.
     The camera will follow the bike in a third-person view.
+    `actor` can be an actor or an actor snapshot from `world.get_snapshot()`.
     """
+    global last_camera_pose
+
     if not actor:
         return
 
@@ -63,13 +82,19 @@ def update_spectator_camera(actor, spectator):
     location = transform.location
     rotation = transform.rotation
 
+    # Skip moving the camera if the bike hasn't moved since the last update
+    pose = (actor.id, round(location.x, 2), round(location.y, 2), round(location.z, 2), round(rotation.yaw, 1))
+    if pose == last_camera_pose:
+        return
+    last_camera_pose = pose
+
     # Position the camera behind and slightly above the bike
     distance_behind = 6  # Distance behind the bike
     height = 2  # Height above the ground
-    yaw_radians = math.radians(rotation.yaw)
+    yaw_radians = _radians(rotation.yaw)
 
-    camera_x = location.x - distance_behind * math.cos(yaw_radians)
-    camera_y = location.y - distance_behind * math.sin(yaw_radians)
+    camera_x = location.x - distance_behind * _cos(yaw_radians)
+    camera_y = location.y - distance_behind * _sin(yaw_radians)
     camera_z = location.z + height
 
     camera_location = carla.Location(x=camera_x, y=camera_y, z=camera_z)
@@ -80,21 +105,28 @@ def update_spectator_camera(actor, spectator):
 # Logging Functionality
 ############################
 
-def calculate_distance(actor1, actor2):
+def calculate_distance(loc1, loc2):
     """
-    Calculate the Euclidean distance between two actors.
+    Calculate the Euclidean distance between two locations.
     """
-    if not actor1 or not actor2:
-        return float('inf')  # Return a large value if either actor is missing
+    if loc1 is None or loc2 is None:
+        return float('inf')  # Return a large value if either location is missing
 
-    loc1 = actor1.get_location()
-    loc2 = actor2.get_location()
-    return math.sqrt((loc1.x - loc2.x) ** 2 + (loc1.y - loc2.y) ** 2 + (loc1.z - loc2.z) ** 2)
+    dx = loc1.x - loc2.x
+    dy = loc1.y - loc2.y
+    dz = loc1.z - loc2.z
+    return math.sqrt(dx * dx + dy * dy + dz * dz)
 
-def log_bike_data(bike, car1, car2, start_time):
+def log_bike_data(bike, car1_location, car2_location, start_time):
     """
-    Log the bike's movement data to a CSV file.
+    Log the bike's movement data.
+    The row is stored in the preallocated `log_buffer`, which is saved by `save_bike_log` at shutdown.
+    `bike` can be the bike actor or its snapshot from `world.get_snapshot()`.
+    The cars are braked for the whole run, so their locations are read once
+    by the control loop and passed in instead of being queried every tick.
     """
+    global log_buffer, log_row_count
+
     if not bike:
         return
 
@@ -104,39 +136,61 @@ def log_bike_data(bike, car1, car2, start_time):
     # Get the bike's location and speed
     transform = bike.get_transform()
     velocity = bike.get_velocity()
-    speed = math.sqrt(velocity.x ** 2 + velocity.y ** 2 + velocity.z ** 2) * 3.6  # Convert m/s to km/h
+    speed = velocity.length() * 3.6  # Convert m/s to km/h
 
     # Get the bike's position
-    x, y, z = transform.location.x, transform.location.y, transform.location.z
+    location = transform.location
+    x, y, z = location.x, location.y, location.z
 
     # Calculate proximity to other vehicles
-    distance_to_car1 = calculate_distance(bike, car1)
-    distance_to_car2 = calculate_distance(bike, car2)
+    distance_to_car1 = calculate_distance(location, car1_location)
+    distance_to_car2 = calculate_distance(location, car2_location)
+
+    # Double the buffer if the run outlasts the preallocated rows
+    if log_row_count == len(log_buffer):
+        log_buffer = np.concatenate((log_buffer, np.empty_like(log_buffer)))
 
-    # Write data to the log file
-    with open(log_file, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([current_time, speed, x, y, z, distance_to_car1, distance_to_car2])
+    # Buffer the row until the log is saved
+    log_buffer[log_row_count] = (current_time, speed, x, y, z, distance_to_car1, distance_to_car2)
+    log_row_count += 1
+
+def save_bike_log():
+    """
+    Write the buffered log rows to the CSV log file in one go,
+    plus a Parquet copy when pyarrow is installed.
+    """
+    rows = log_buffer[:log_row_count]
+    np.savetxt(log_file, rows, fmt='%.6f', delimiter=',', header=','.join(log_columns), comments='')
+
+    if pa is not None:
+        columns = [pa.array(np.ascontiguousarray(rows[:, i])) for i in range(len(log_columns))]
+        pq.write_table(pa.Table.from_arrays(columns, names=log_columns), log_parquet_file)
 
 ############################
 # CARLA Control Loop
 ############################
 
 async def carla_control_loop():
-    global bike_actor, car_actor1, car_actor2, spectator_actor, client, is_running
+    global bike_actor, car_actor1, car_actor2, spectator_actor, client, is_running, log_row_count
 
-    # Initialize the log file
-    with open(log_file, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Time (s)", "Speed (km/h)", "X", "Y", "Z", "Distance to Car 1 (m)", "Distance to Car 2 (m)"])
+    # Log rows are kept in memory and written out when the simulation ends
+    log_row_count = 0
 
     start_time = time.time()
+    original_settings = None
 
     try:
         client = carla.Client('127.0.0.1', 2000)
         client.set_timeout(10.0)
         world = client.get_world()
 
+        # Run the server in synchronous mode, so each tick gives one snapshot of every actor
+        original_settings = world.get_settings()
+        settings = world.get_settings()
+        settings.synchronous_mode = True
+        settings.fixed_delta_seconds = 0.05
+        world.apply_settings(settings)
+
         # Get the blueprint library
         blueprint_library = world.get_blueprint_library()
 
@@ -181,9 +235,19 @@ async def carla_control_loop():
         print(f"Starting simulation recording: {recording_file}")
         client.start_recorder(recording_file)
 
+        # The cars stay braked, so read their locations once (after a server tick, so they're valid)
+        world.tick()
+        snapshot = world.get_snapshot()
+        car1_location = snapshot.find(car_actor1.id).get_transform().location
+        car2_location = snapshot.find(car_actor2.id).get_transform().location
+
+        # Track the control keys with hooks instead of polling them every tick
+        register_key_hooks()
+
         # Basic control loop
+        tick_counter = 0
         while is_running:
-            if keyboard.is_pressed('k'):  # Check if 'k' is pressed to stop the simulation
+            if keys_down['k']:  # Check if 'k' was pressed to stop the simulation
                 print("Simulation ending as 'k' was pressed.")
                 is_running = False
                 break
@@ -194,23 +258,45 @@ async def carla_control_loop():
                 control = carla.VehicleControl(throttle=throttle, steer=steer)
                 bike_actor.apply_control(control)
 
+            # Advance the simulation one step and take the snapshot of that frame
+            world.tick()
+            snapshot = world.get_snapshot()
+
+            if bike_actor:
+                # Read the bike's transform and velocity from the snapshot instead of separate RPCs
+                bike_snapshot = snapshot.find(bike_actor.id)
+
                 # Update the spectator camera to follow the bike
-                update_spectator_camera(bike_actor, spectator_actor)
+                update_spectator_camera(bike_snapshot, spectator_actor)
+
+                # Log the bike's data every few ticks
+                if tick_counter % log_every_nth_tick == 0:
+                    log_bike_data(bike_snapshot, car1_location, car2_location, start_time)
 
-                # Log the bike's data
-                log_bike_data(bike_actor, car_actor1, car_actor2, start_time)
+            tick_counter += 1
 
             await asyncio.sleep(0.05)  # 20 FPS control loop
 
     finally:
+        # Save the bike log first, so a dead server can't lose it
+        save_bike_log()
+
         # Stop recording the simulation
         print(f"Stopping simulation recording: {recording_file}")
         client.stop_recorder()
 
-        # Check if the recording file was created
-        if os.path.exists(recording_file):
-            print(f"Recording saved successfully: {recording_file}")
-        else:
+        # Put the server back in its original (asynchronous) mode
+        if original_settings:
+            world.apply_settings(original_settings)
+
+        # Remove the keyboard hooks
+        keyboard.unhook_all()
+
+        # Check if the recording file was created, and report its size
+        try:
+            recording_size = os.stat(recording_file).st_size
+            print(f"Recording saved successfully ({recording_size} bytes): {recording_file}")
+        except FileNotFoundError:
             print(f"Error: Recording file {recording_file} was not created.")
 
         # Cleanup
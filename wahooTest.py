@@ -2,6 +2,9 @@ import asyncio
 from bleak import BleakScanner, BleakClient
 from colorama import init, Fore
 import time
+import math
+from collections import deque
+from bikesim.ble import csc_measurement  # CSC measurement layout, shared with the bike sims
 
 # Initialize for colored print statements
 init(autoreset=True)
@@ -14,44 +17,75 @@ shared_data = {
 
 # Constants
 WHEEL_RADIUS_CM = 35  # Radius in cm
-WHEEL_CIRCUMFERENCE_KM = 2 * 3.14159 * (WHEEL_RADIUS_CM / 100000)  # Circumference in km
+WHEEL_CIRCUMFERENCE_KM = math.tau * (WHEEL_RADIUS_CM * 1e-5)  # Circumference in km
+WHEEL_CIRCUMFERENCE_KM_HOURS = WHEEL_CIRCUMFERENCE_KM * 3600.0  # km per revolution, times seconds per hour
+CSC_MEASUREMENT_UUID = "00002a5b-0000-1000-8000-00805f9b34fb"  # CSC Measurement characteristic UUID
+LIST_SERVICES = False  # Print the sensor's services and characteristics after connecting
 
 # Variables to track speed
 previous_revolutions = 0
 previous_time = 0
 
+# Measurements waiting to be printed by `drain_log`: (flags, revolutions, event time, speed or None)
+log_ring = deque(maxlen=256)  # The oldest are dropped if printing falls this far behind
+
 def parse_csc_measurement(data):
     """
     Parse speed/cadence data from Wahoo sensor and calculate speed in km/h.
     """
-    global shared_data, previous_revolutions, previous_time
+    global previous_revolutions, previous_time
+    sd = shared_data  # Local name for the dict, saving repeated global lookups
+
+    if len(data) < csc_measurement.size:
+        print(Fore.RED + f"Ignoring short CSC measurement: {bytes(data).hex()}")
+        return
 
-    flags = data[0]
-    cumulative_wheel_revolutions = int.from_bytes(data[1:5], byteorder='little')
-    last_wheel_event_time_raw = int.from_bytes(data[5:7], byteorder='little')
+    flags, cumulative_wheel_revolutions, last_wheel_event_time_raw = csc_measurement.unpack_from(data, 0)
 
     # Convert last wheel event time to seconds
-    last_wheel_event_time_seconds = last_wheel_event_time_raw / 1024
-    ms = (last_wheel_event_time_seconds * 1000) % 1000
+    last_wheel_event_time_seconds = last_wheel_event_time_raw / 1024.0
 
     # Calculate speed
+    speed_kmph = None
     if previous_time > 0:  # Ensure we have a previous time to calculate speed
         time_diff = last_wheel_event_time_seconds - previous_time
         if time_diff > 0:  # Avoid division by zero
             revolutions_diff = cumulative_wheel_revolutions - previous_revolutions
-            speed_kmph = (WHEEL_CIRCUMFERENCE_KM * revolutions_diff) / (time_diff / 3600)
-            print(Fore.CYAN + f"Speed: {speed_kmph:.2f} km/h")
+            speed_kmph = WHEEL_CIRCUMFERENCE_KM_HOURS * revolutions_diff / time_diff  # revolutions per second -> km/h
 
     # Update shared data and previous values
-    shared_data["cumulative_wheel_revolutions"] = cumulative_wheel_revolutions
-    shared_data["last_wheel_event_time"] = last_wheel_event_time_seconds
+    sd["cumulative_wheel_revolutions"] = cumulative_wheel_revolutions
+    sd["last_wheel_event_time"] = last_wheel_event_time_seconds
     previous_revolutions = cumulative_wheel_revolutions
     previous_time = last_wheel_event_time_seconds
 
-    # Print raw data
-    print(Fore.GREEN + f"Flags: {flags}")
-    print(Fore.GREEN + f"Cumulative Wheel Revolutions: {cumulative_wheel_revolutions}")
-    print(Fore.GREEN + f"Last Wheel Event Time: {int(last_wheel_event_time_seconds)}s {int(ms)}ms")
+    # Queue the data for printing, so the BLE callback never waits on the console
+    log_ring.append((flags, cumulative_wheel_revolutions, last_wheel_event_time_seconds, speed_kmph))
+
+def print_log_ring():
+    """
+    Print and remove every measurement queued in `log_ring`, in one write.
+    """
+    lines = []
+    while log_ring:
+        flags, cumulative_wheel_revolutions, last_wheel_event_time_seconds, speed_kmph = log_ring.popleft()
+        ms = (last_wheel_event_time_seconds * 1000) % 1000
+        if speed_kmph is not None:
+            lines.append(Fore.CYAN + f"Speed: {speed_kmph:.2f} km/h")
+        lines.append(Fore.GREEN + f"Flags: {flags}")
+        lines.append(Fore.GREEN + f"Cumulative Wheel Revolutions: {cumulative_wheel_revolutions}")
+        lines.append(Fore.GREEN + f"Last Wheel Event Time: {int(last_wheel_event_time_seconds)}s {int(ms)}ms")
+
+    if lines:
+        print("\n".join(lines))
+
+async def drain_log(interval=0.1):
+    """
+    Print the queued measurements every `interval` seconds until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        print_log_ring()
 
 async def find_and_connect_wahoo():
     """
@@ -74,22 +108,25 @@ async def find_and_connect_wahoo():
     async with BleakClient(wahoo_device.address) as client:
         print(Fore.BLUE + f"Connected to {wahoo_device.address}")
 
-        # List available services and characteristics
-        services = await client.get_services()
-        for service in services:
-            print(Fore.YELLOW + f"Service: {service.uuid}")
-            for characteristic in service.characteristics:
-                print(Fore.YELLOW + f"  Characteristic: {characteristic.uuid}")
+        # List available services and characteristics (the client already discovered them when connecting)
+        if LIST_SERVICES:
+            for service in client.services:
+                print(Fore.YELLOW + f"Service: {service.uuid}")
+                for characteristic in service.characteristics:
+                    print(Fore.YELLOW + f"  Characteristic: {characteristic.uuid}")
 
-        # CSC Measurement characteristic UUID
-        characteristic_uuid = "00002a5b-0000-1000-8000-00805f9b34fb"
+        # Resolve the CSC Measurement characteristic once and use the object, not the UUID, from here on
+        characteristic = client.services.get_characteristic(CSC_MEASUREMENT_UUID)
+        if characteristic is None:
+            print(Fore.RED + "CSC Measurement characteristic not found.")
+            return
 
         # Start receiving notifications
-        await client.start_notify(characteristic_uuid, notification_handler)
+        await client.start_notify(characteristic, notification_handler)
 
         print(Fore.BLUE + "Listening for notifications from Wahoo sensor...")
         await asyncio.sleep(30)  # Listen for 30 seconds
-        await client.stop_notify(characteristic_uuid)
+        await client.stop_notify(characteristic)
 
 def notification_handler(sender, data):
     """
@@ -98,7 +135,12 @@ def notification_handler(sender, data):
     parse_csc_measurement(data)
 
 async def main():
-    await find_and_connect_wahoo()
+    drain_task = asyncio.create_task(drain_log())
+    try:
+        await find_and_connect_wahoo()
+    finally:
+        drain_task.cancel()
+        print_log_ring()  # Print whatever arrived since the last batch
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
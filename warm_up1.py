@@ -1,107 +1,82 @@
 import carla
 import asyncio
-import threading
-import socket
 import time
-import math
-import json
+import array
 from bleak import BleakScanner, BleakClient
-from numpy import random
+import random
+from bikesim.ble import csc_measurement  # CSC measurement layout, shared with the bike sensor sims
+from bikesim import socket_server  # Heading server, shared with the bike sensor sims
+from bikesim.camera import sin_lut, cos_lut  # Indexed with `int(degrees * 10) % 3600`
+from bikesim.timing import sleep_until_next_tick
 
 # Global variables
 bike_actor = None
 spectator_actor = None
-latest_heading_data = None
 shared_data = {
     "cumulative_wheel_revolutions": 0,
     "last_wheel_event_time": 0,
     "last_throttle": 0.1  # Initial throttle value
 }
+steer_lut = array.array('d', [max(-1.0, min(1.0, sine * 0.5)) for sine in sin_lut])  # Clamped, half-severity steering per 0.1 degree of heading
 vehicles_list = []
-walkers_list = []
+walker_ids = []  # Walker actor IDs, walker_speeds/walker_ctrls are kept alongside as parallel lists
+# (a walker whose controller failed to spawn has None in walker_ctrls)
+walker_speeds = []
+walker_ctrls = []
 all_id = []
 is_running = True
 notification_count = 0
 start_time = None
-
-#### Socket Server ####
-def run_socket_server():
-    """
-    Socket server that listens for incoming JSON data (heading, location, etc.)
-    and updates `latest_heading_data`.
-    """
-    global latest_heading_data
-
-    host = '0.0.0.0'
-    port = 12345
-
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((host, port))
-        s.listen()
-        print(f"Listening on {host}:{port}")
-
-        conn, addr = s.accept()
-        with conn:
-            print(f"Connected by {addr}")
-            buffer = ""
-
-            while True:
-                data = conn.recv(1024)
-                if not data:
-                    break
-
-                try:
-                    decoded_data = data.decode()  # bytes -> string
-                    buffer += decoded_data
-
-                    # Attempt to parse JSON objects from buffer
-                    while True:
-                        try:
-                            json_object, index = json.JSONDecoder().raw_decode(buffer)
-                            buffer = buffer[index:].strip()
-                            latest_heading_data = json_object  # Update global
-                        except json.JSONDecodeError:
-                            # Incomplete data, wait for more
-                            break
-                except Exception as e:
-                    print("Socket receive error:", e)
+ble_q = None  # Raw BLE notifications waiting for `ble_worker`, created by main() on the running loop
 
 #### BLE Wahoo Sensor ####
 def parse_csc_measurement(data):
     """
     Parse speed/cadence data from Wahoo sensor.
     """
-    global shared_data
+    sd = shared_data  # Local name for the dict, saving repeated global lookups
 
-    flags = data[0]
-    cumulative_wheel_revolutions = int.from_bytes(data[1:5], byteorder='little')
-    last_wheel_event_time_raw = int.from_bytes(data[5:7], byteorder='little')
+    if len(data) < csc_measurement.size:
+        print(f"Ignoring short CSC measurement: {bytes(data).hex()}")
+        return
 
-    # Convert last wheel event time to seconds
-    last_wheel_event_time_seconds = last_wheel_event_time_raw / 1024
+    flags, cumulative_wheel_revolutions, last_wheel_event_time_raw = csc_measurement.unpack_from(data, 0)
 
-    shared_data["cumulative_wheel_revolutions"] = cumulative_wheel_revolutions
-    shared_data["last_wheel_event_time"] = last_wheel_event_time_seconds
+    # Convert last wheel event time to seconds
+    sd["cumulative_wheel_revolutions"] = cumulative_wheel_revolutions
+    sd["last_wheel_event_time"] = last_wheel_event_time_raw / 1024.0
 no_rotation_count = 0  # Counts consecutive transmissions with no rotations
 
 def notification_handler(sender, data):
     """
     Handle notifications from the BLE Wahoo sensor.
+    Only queues the raw data, so bleak gets control back straight away; `ble_worker` parses it.
     """
-    global notification_count, start_time, no_rotation_count
+    try:
+        ble_q.put_nowait(bytes(data))
+    except asyncio.QueueFull:
+        pass  # The worker has fallen behind, drop this sample rather than block bleak
+
+async def ble_worker():
+    """
+    Parse the queued BLE notifications and track wheel rotations.
+    """
+    global notification_count, no_rotation_count
 
-    notification_count += 1
+    while True:
+        data = await ble_q.get()
+        notification_count += 1
 
-    # Parse the BLE data
-    previous_revolutions = shared_data["cumulative_wheel_revolutions"]
-    parse_csc_measurement(data)
-    current_revolutions = shared_data["cumulative_wheel_revolutions"]
+        # Parse the BLE data
+        previous_revolutions = shared_data["cumulative_wheel_revolutions"]
+        parse_csc_measurement(data)
+        current_revolutions = shared_data["cumulative_wheel_revolutions"]
 
-    # Check if there are no new rotations
-    if current_revolutions == previous_revolutions:
-        no_rotation_count += 1
-    else:
-        no_rotation_count = 0  # Reset the counter if rotations are detected
+        # Check if there are no new rotations
+        if current_revolutions == previous_revolutions:
+            no_rotation_count += 1
+        else:
+            no_rotation_count = 0  # Reset the counter if rotations are detected
 
 async def find_and_connect_wahoo():
     """
@@ -153,16 +128,14 @@ async def find_and_connect_wahoo():
     print("Failed to connect to Wahoo device after 3 attempts.")
 
 #### Bike Control Logic ####
-def process_heading_data(data):
+def process_heading_data(heading):
     """
     Process heading data to calculate steering and throttle for the bike.
     """
     global no_rotation_count
 
     try:
-        heading = float(data.get("locationTrueHeading", 0.0))
-        steer = math.sin(math.radians(heading)) * 0.5  # Reduce steering severity
-        steer = max(-1.0, min(1.0, steer))  # Clamp steering value
+        steer = steer_lut[int(heading * 10) % 3600]  # Reduced severity, clamped
 
         # Use wheel revolutions as a simple throttle logic
         revolutions = shared_data["cumulative_wheel_revolutions"]
@@ -181,15 +154,14 @@ def process_heading_data(data):
         return 0.0, 0.1
     
 #### First-Person Camera ####
-def update_spectator_camera(actor, spectator):
+def update_spectator_camera(transform, spectator):
     """
     Dynamically position the camera at the cyclist's head for a first-person view.
+    `transform` is the cyclist's transform, read once per tick by the control loop.
     """
-    if not actor or not spectator:
+    if not transform or not spectator:
         return
 
-    # Get the transform of the actor (cyclist)
-    transform = actor.get_transform()
     location = transform.location
     rotation = transform.rotation
 
@@ -198,9 +170,9 @@ def update_spectator_camera(actor, spectator):
     forward_offset = 0.4  # Slightly forward to simulate head position
 
     # Calculate the camera's position relative to the cyclist
-    yaw_radians = math.radians(rotation.yaw)
-    camera_x = location.x + forward_offset * math.cos(yaw_radians)
-    camera_y = location.y + forward_offset * math.sin(yaw_radians)
+    yaw_index = int(rotation.yaw * 10) % 3600
+    camera_x = location.x + forward_offset * cos_lut[yaw_index]
+    camera_y = location.y + forward_offset * sin_lut[yaw_index]
     camera_z = location.z + head_offset
 
     # Set the camera's location and rotation
@@ -212,29 +184,39 @@ def update_spectator_camera(actor, spectator):
 def spawn_traffic(world, client, num_vehicles=30, num_walkers=10):
     """
     Spawns vehicles and pedestrians in the Carla world.
+    Returns the traffic manager driving the vehicles.
     """
-    global vehicles_list, walkers_list, all_id
+    global vehicles_list, walker_ids, walker_speeds, walker_ctrls, all_id
 
     # Access TrafficManager via the client
     traffic_manager = client.get_trafficmanager(8000)
     traffic_manager.set_global_distance_to_leading_vehicle(2.5)
 
     # Get blueprints for vehicles and pedestrians
-    blueprints = world.get_blueprint_library().filter('vehicle.*')
-    blueprints_walkers = world.get_blueprint_library().filter('walker.pedestrian.*')
-
-    # Spawn vehicles
+    blueprint_library = world.get_blueprint_library()
+    blueprints = list(blueprint_library.filter('vehicle.*'))
+    blueprints_walkers = list(blueprint_library.filter('walker.pedestrian.*'))
+
+    # Look up each vehicle's recommended colours once, rather than for every spawn
+    color_choices = {
+        blueprint.id: blueprint.get_attribute('color').recommended_values
+        for blueprint in blueprints if blueprint.has_attribute('color')
+    }
+
+    # Spawn vehicles (the commands and traffic manager port are looked up once, not on every iteration)
+    SpawnActor = carla.command.SpawnActor
+    SetAutopilot = carla.command.SetAutopilot
+    FutureActor = carla.command.FutureActor
+    tm_port = traffic_manager.get_port()
     spawn_points = world.get_map().get_spawn_points()
-    random.shuffle(spawn_points)
     batch = []
-    for n, transform in enumerate(spawn_points[:num_vehicles]):
+    for transform in random.sample(spawn_points, min(num_vehicles, len(spawn_points))):
         blueprint = random.choice(blueprints)
-        if blueprint.has_attribute('color'):
-            color = random.choice(blueprint.get_attribute('color').recommended_values)
-            blueprint.set_attribute('color', color)
+        colors = color_choices.get(blueprint.id)
+        if colors:
+            blueprint.set_attribute('color', random.choice(colors))
         blueprint.set_attribute('role_name', 'autopilot')
-        batch.append(carla.command.SpawnActor(blueprint, transform)
-                     .then(carla.command.SetAutopilot(carla.command.FutureActor, True, traffic_manager.get_port())))
+        batch.append(SpawnActor(blueprint, transform).then(SetAutopilot(FutureActor, True, tm_port)))
 
     for response in client.apply_batch_sync(batch, True):
         if response.error:
@@ -256,33 +238,34 @@ def spawn_traffic(world, client, num_vehicles=30, num_walkers=10):
             walker_speed.append(walker_bp.get_attribute('speed').recommended_values[1])
         else:
             walker_speed.append(0.0)
-        batch.append(carla.command.SpawnActor(walker_bp, spawn_point))
+        batch.append(SpawnActor(walker_bp, spawn_point))
     results = client.apply_batch_sync(batch, True)
     for i, result in enumerate(results):
         if result.error:
             print(result.error)
         else:
-            walkers_list.append({"id": result.actor_id, "speed": walker_speed[i]})
+            walker_ids.append(result.actor_id)
+            walker_speeds.append(walker_speed[i])
 
     # Spawn walker controllers
-    walker_controller_bp = world.get_blueprint_library().find('controller.ai.walker')
+    walker_controller_bp = blueprint_library.find('controller.ai.walker')
     batch = []
-    for walker in walkers_list:
-        batch.append(carla.command.SpawnActor(walker_controller_bp, carla.Transform(), walker["id"]))
+    for walker_id in walker_ids:
+        batch.append(SpawnActor(walker_controller_bp, carla.Transform(), walker_id))
     results = client.apply_batch_sync(batch, True)
-    for i, result in enumerate(results):
+    for result in results:
         if result.error:
             print(result.error)
-        else:
-            walkers_list[i]["controller"] = result.actor_id
+    walker_ctrls = [None if result.error else result.actor_id for result in results]  # Lines up with walker_ids
 
     # Start walker controllers
-    all_actors = world.get_actors([walker["controller"] for walker in walkers_list])
+    all_actors = world.get_actors([ctrl_id for ctrl_id in walker_ctrls if ctrl_id is not None])
     for actor in all_actors:
         actor.start()
         actor.go_to_location(world.get_random_location_from_navigation())
 
-    print(f"Spawned {len(vehicles_list)} vehicles and {len(walkers_list)} pedestrians.")
+    print(f"Spawned {len(vehicles_list)} vehicles and {len(walker_ids)} pedestrians.")
+    return traffic_manager
 
 #### Main Simulation Loop ####
 async def carla_control_loop():
@@ -304,46 +287,79 @@ async def carla_control_loop():
 
     # Move spectator to follow the bike
     spectator_actor = world.get_spectator()
-    update_spectator_camera(bike_actor, spectator_actor)
+    update_spectator_camera(bike_transform, spectator_actor)
 
     # Spawn traffic
-    spawn_traffic(world, client)
+    traffic_manager = spawn_traffic(world, client)
+
+    # Run the server and traffic manager in synchronous mode, so each control update gets exactly one tick
+    original_settings = world.get_settings()
+    settings = world.get_settings()
+    settings.synchronous_mode = True
+    settings.fixed_delta_seconds = 0.05
+    world.apply_settings(settings)
+    traffic_manager.set_synchronous_mode(True)
+
+    loop = asyncio.get_running_loop()
+    tick_interval = 0.05
+    next_tick_time = loop.time()
 
     try:
         while is_running:
+            # Read the bike's transform once per tick, from the snapshot of the last frame
+            bike_snapshot = world.get_snapshot().find(bike_actor.id) if bike_actor else None
+            bike_tf = bike_snapshot.get_transform() if bike_snapshot else None
+
             # Update the spectator camera to follow the bike dynamically
-            if bike_actor and spectator_actor:
-                update_spectator_camera(bike_actor, spectator_actor)
+            if bike_tf and spectator_actor:
+                update_spectator_camera(bike_tf, spectator_actor)
 
             # Process heading data and control the bike
-            if latest_heading_data:
-                steer, throttle = process_heading_data(latest_heading_data)
+            heading_data = socket_server.latest_heading_data
+            if heading_data:
+                heading, _ = heading_data
+                steer, throttle = process_heading_data(heading)
                 bike_actor.apply_control(carla.VehicleControl(throttle=throttle, steer=steer))
 
-            # Sleep to control the update rate
-            await asyncio.sleep(0.05)
+            # Advance the simulation one step (off the event loop, so BLE and the socket keep running)
+            await loop.run_in_executor(None, world.tick)
+
+            # Sleep until the next tick is due, so the simulation runs in real time without drifting
+            next_tick_time = await sleep_until_next_tick(next_tick_time, tick_interval)
     finally:
-        # Cleanup
+        # Put the server and traffic manager back in asynchronous mode
+        traffic_manager.set_synchronous_mode(False)
+        world.apply_settings(original_settings)
+
+        # Cleanup: destroy every actor in one batch instead of one round-trip each
+        actor_ids = [ctrl_id for ctrl_id in walker_ctrls if ctrl_id is not None] + walker_ids + vehicles_list
         if bike_actor:
-            bike_actor.destroy()
-        for vehicle_id in vehicles_list:
-            world.get_actor(vehicle_id).destroy()
-        for walker in walkers_list:
-            world.get_actor(walker["id"]).destroy()
-            world.get_actor(walker["controller"]).destroy()
+            actor_ids.append(bike_actor.id)
+        client.apply_batch_sync([carla.command.DestroyActor(actor_id) for actor_id in actor_ids])
         print("Simulation ended and all actors destroyed.")
 
 #### Main Entry Point ####
 async def main():
-    # Start the socket server in a background thread
-    socket_thread = threading.Thread(target=run_socket_server, daemon=True)
-    socket_thread.start()
+    global ble_q
+
+    # Start the socket server on the event loop
+    socket_task = asyncio.create_task(socket_server.run_socket_server(read_size=8192))
+    socket_task.add_done_callback(socket_server.report_server_error)
+
+    # Start the worker that parses BLE notifications
+    ble_q = asyncio.Queue(maxsize=64)
+    ble_worker_task = asyncio.create_task(ble_worker())
 
     # Start the BLE Wahoo sensor connection
     ble_task = asyncio.create_task(find_and_connect_wahoo())
 
     # Start the Carla control loop
-    await asyncio.gather(ble_task, carla_control_loop())
+    try:
+        await asyncio.gather(ble_task, carla_control_loop())
+    finally:
+        # The server and BLE worker run forever, so stop them once the simulation is over
+        socket_task.cancel()
+        ble_worker_task.cancel()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file